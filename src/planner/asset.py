@@ -1,16 +1,53 @@
 from __future__ import annotations
 from abc import ABC, ABCMeta
 from dataclasses import dataclass
-from typing import Self, Any, cast, TYPE_CHECKING
-from collections.abc import Hashable
-from functools import wraps
-import inspect
+from typing import Self, Any, ClassVar, cast, TYPE_CHECKING
+from types import FunctionType
 
 from .caps import Caps, ContextCap
 if TYPE_CHECKING:
     from .recipe import Recipe
 
 
+def _accepts_caps(attr: Any) -> bool:
+    """Whether the callable `attr` expects a `caps` parameter."""
+    # Only needed at class creation, see `Asset.__init_subclass__`
+    import inspect
+
+    sig = getattr(attr, "__signature__", None)
+    if sig is None and inspect.isroutine(attr) and not hasattr(attr, "__wrapped__") \
+            and (code := getattr(attr, "__code__", None)) is not None:
+        # Plain Python function: the parameter names are the leading variable names
+        n_params = code.co_argcount + code.co_kwonlyargcount \
+            + bool(code.co_flags & inspect.CO_VARARGS) + bool(code.co_flags & inspect.CO_VARKEYWORDS)
+        return "caps" in code.co_varnames[:n_params]
+    if not isinstance(sig, inspect.Signature):
+        try:
+            sig = inspect.signature(attr)
+        except (TypeError, ValueError):
+            # builtins / C-extensions may not have signatures
+            return False
+    return "caps" in sig.parameters
+
+
+def _caps_methods(cls: type) -> frozenset[str]:
+    """Names of the methods of `cls` that expect a `caps` parameter, including inherited ones."""
+    import inspect
+
+    names: set[str] = set()
+    # Look along the whole MRO, since methods may also come from non-Asset mixins.
+    # Static lookup, so that no descriptors or class properties are run.
+    for name in dir(cls):
+        attr = inspect.getattr_static(cls, name, None)
+        if isinstance(attr, (staticmethod, classmethod)):
+            attr = attr.__func__
+        elif not isinstance(attr, FunctionType):
+            continue
+        if _accepts_caps(attr):
+            names.add(name)
+    return frozenset(names)
+
+
 class _AssetMeta(ABCMeta, type):
     def __repr__(cls):
         return cls.__name__
@@ -22,61 +59,72 @@ class _AssetMeta(ABCMeta, type):
 
 class Asset(ABC, metaclass=_AssetMeta):
     """Marker base class for all assets produced/consumed by Recipes."""
+    __slots__ = ()
+
+    __caps_methods__: ClassVar[frozenset[str]] = frozenset()
+    """Names of the methods that expect a `caps` parameter. Computed at class creation."""
+
+    def __init_subclass__(cls, **kwargs: Any) -> None:
+        super().__init_subclass__(**kwargs)
+        cls.__caps_methods__ = _caps_methods(cls)
 
     def _for_recipe(self, recipe_context: Recipe) -> Self:
+        if not type(self).__caps_methods__:
+            # Nothing to inject caps into, so no need for a `ContextCap` or façade
+            return self
         return cast(Self, _BoundAsset(self, recipe_context))
 
 
 class _BoundAsset[T: Asset]:
     """A bound façade: exposes the same public methods as T,
     but injects a `ContextCap` and Recipe-defined caps into methods that expect a `caps` parameter."""
+    __slots__ = ("_target", "_recipe_context", "_context_cap", "_default_caps", "_wrapper_cache")
+
     _target: T
     _recipe_context: Recipe
     _context_cap: ContextCap
-    _wrapper_cache: dict[Hashable, Any]
+    _default_caps: Caps
+    """Caps injected into every call, overridden by caller-provided caps. Fixed for the lifetime of the bound asset."""
+    _wrapper_cache: dict[str, Any]
 
     def __init__(self, target: T, recipe_context: Recipe) -> None:
         self._target = target
         self._recipe_context = recipe_context
         self._context_cap = ContextCap(
-            recipe_name=type(recipe_context).name
+            recipe_name=type(recipe_context).__name__
         )
+        self._default_caps = Caps(self._context_cap, *recipe_context._caps)
         self._wrapper_cache = dict()
 
     def __getattr__(self, name: str) -> Any:
-        if name in self._wrapper_cache:
+        try:
             return self._wrapper_cache[name]
+        except KeyError:
+            pass
 
         attr = getattr(self._target, name)
-        if not callable(attr):
-            return attr
-
-        # Decide whether to inject caps based on signature
-        try:
-            sig = inspect.signature(attr)
-        except (TypeError, ValueError):
-            # builtins / C-extensions may not have signatures
-            return attr
-
-        if "caps" not in sig.parameters:
+        if name not in type(self._target).__caps_methods__ or not callable(attr):
             return attr
 
         # Wrap: inject caps, but override with provided caps
-        @wraps(attr)
         def wrapped(*args: Any, **kwargs: Any) -> Any:
             if 'caps' in kwargs:
-                assert isinstance(c := kwargs['caps'], Caps)
-                passed_caps = list(c.values())
+                c = kwargs['caps']
+                assert isinstance(c, Caps)
+                kwargs['caps'] = self._default_caps._merge(c)
             else:
-                passed_caps = []
-            kwargs['caps'] = Caps([self._context_cap, *self._recipe_context._caps, *passed_caps])
+                kwargs['caps'] = self._default_caps
             return attr(*args, **kwargs)
 
+        # Only the metadata useful for debugging, `functools.wraps` copies a lot more
+        wrapped.__name__ = name
+        wrapped.__wrapped__ = attr  # type: ignore[attr-defined]
+
         self._wrapper_cache[name] = wrapped
         return wrapped
 
 
-@dataclass(frozen=True)
+@dataclass(frozen=True, slots=True, weakref_slot=True)
 class DataAsset[T](Asset):
     """Simple wrapper around a data payload."""
     data: T
@@ -1,23 +1,43 @@
 from __future__ import annotations
 from dataclasses import dataclass, field
-from typing import Any, cast, Callable, overload
+from typing import Any, ClassVar, Self, cast, Callable, overload
 from collections.abc import Mapping, Iterable, Hashable
 import itertools as it
 
 
 class _CapMeta(type):
+    def __init__(cls, *args: Any, **kwargs: Any):
+        super().__init__(*args, **kwargs)
+        cls._cap_type = cls
+
     def __repr__(cls):
         return cls.__name__
 
 
-@dataclass(frozen=True)
+@dataclass(frozen=True, slots=True)
 class Cap(metaclass=_CapMeta):
     """A capability/setting of a recipe. May be read by asset methods."""
 
+    _cap_type: ClassVar[type[Cap]]
+    """The concrete cap class, i.e. the key under which `Caps` stores an instance."""
+
 
 class Caps(Mapping[type[Cap], Cap]):
-    """Capability container."""
-    _data: dict[type[Cap], Cap]
+    """Capability container.
+
+    Holds at most one cap per type; later caps override earlier ones of the same type.
+    There are only ever a handful of caps, so they are kept in a tuple of (type, cap) pairs
+    and looked up by a linear scan comparing the types by identity."""
+    __slots__ = ("_pairs",)
+    _pairs: tuple[tuple[type[Cap], Cap], ...]
+
+    EMPTY: ClassVar[Caps]
+    """Shared empty instance, returned by `Caps()`."""
+
+    def __new__(cls, *caps_or_iterables: Cap | Iterable[Cap]) -> Self:
+        if not caps_or_iterables and "EMPTY" in cls.__dict__:
+            return cls.EMPTY
+        return super().__new__(cls)
 
     @overload
     def __init__(self) -> None: ...
@@ -26,48 +46,92 @@ class Caps(Mapping[type[Cap], Cap]):
     @overload
     def __init__(self, *caps: Cap) -> None: ...
     def __init__(self, *caps_or_iterables: Cap | Iterable[Cap]):
-        self._data = dict()
-
         if not caps_or_iterables:
+            self._pairs = ()
             return
 
         # If called as Caps(iterable), accept that.
         if not isinstance(caps_or_iterables[0], Cap):
             caps_or_iterables = cast(tuple[Iterable[Cap]], caps_or_iterables)
-            _caps: Iterable[Cap] = it.chain(*caps_or_iterables)
+            if len(caps_or_iterables) == 1:
+                _caps: Iterable[Cap] = caps_or_iterables[0]
+            else:
+                _caps = it.chain(*caps_or_iterables)
         else:
             _caps = cast(tuple[Cap, ...], caps_or_iterables)
 
+        pairs: list[tuple[type[Cap], Cap]] = []
         for cap in _caps:
-            self._data[type(cap)] = cap
+            _set_pair(pairs, cap._cap_type, cap)
+        self._pairs = tuple(pairs)
+
+    def _merge(self, other: Caps) -> Caps:
+        """Combine with the caps of `other`, which take precedence."""
+        if not other._pairs:
+            return self
+        if not self._pairs:
+            return other
+        pairs = list(self._pairs)
+        for typ, cap in other._pairs:
+            _set_pair(pairs, typ, cap)
+        merged = object.__new__(Caps)
+        merged._pairs = tuple(pairs)
+        return merged
 
     def __getitem__[T: Cap](self, key: type[T]) -> T:
-        if key not in self._data:
-            raise KeyError(f"Missing capability '{key}'")
-        return self._data[key]
+        for t, cap in self._pairs:
+            if t is key:
+                return cast(T, cap)
+        raise KeyError(f"Missing capability '{key}'")
 
     def __iter__(self):
-        return iter(self._data)
+        return (t for t, _ in self._pairs)
 
     def __len__(self):
-        return len(self._data)
+        return len(self._pairs)
 
     @overload
     def get[T: Cap](self, key: type[T], default: None = None) -> T | None: ...
     @overload
     def get[T: Cap, D](self, key: type[T], default: D) -> T | D: ...
     def get[T: Cap, D](self, key: type[T], default: D | None = None) -> T | D | None: # type: ignore
-        return cast(T, self._data.get(key, default))
+        for t, cap in self._pairs:
+            if t is key:
+                return cast(T, cap)
+        return default
 
+Caps.EMPTY = Caps()
 
-@dataclass(frozen=True)
+
+def _set_pair(pairs: list[tuple[type[Cap], Cap]], typ: type[Cap], cap: Cap):
+    """Replace the pair of type `typ` in-place, or append it."""
+    for i, (t, _) in enumerate(pairs):
+        if t is typ:
+            pairs[i] = (typ, cap)
+            return
+    pairs.append((typ, cap))
+
+
+@dataclass(frozen=True, eq=False, slots=True)
 class ContextCap(Cap):
     recipe_name: str
     cache: dict[Hashable, Any] = field(default_factory=dict)
+    name_lower: str = field(init=False, repr=False)
+    """Lowercase recipe name, computed once. Default persistent dir tags are derived from it,
+    so it uses `lower()` rather than `casefold()` to keep existing directories where they are."""
+
+    def __post_init__(self):
+        object.__setattr__(self, "name_lower", self.recipe_name.lower())
+
+    # Compared and hashed by identity: the cache is per-recipe state, not a value
+    __eq__ = object.__eq__
+    __hash__ = object.__hash__
 
     def cached[T](self, key: object, factory: Callable[[], T]) -> T:
-        if key in self.cache:
+        try:
             return self.cache[key]  # type: ignore[return-value]
+        except KeyError:
+            pass
         val = factory()
         self.cache[key] = val
         return val
@@ -1,2 +1,7 @@
 from .plan import Plan
 from .planner import Planner
+
+__all__ = [
+    "Plan",
+    "Planner"
+]
@@ -1,21 +1,59 @@
 from __future__ import annotations
 from dataclasses import dataclass
-import networkx as nx
-from collections.abc import Sequence
+from collections.abc import Iterable, Iterator
+from typing import ClassVar
 from collections import deque
-from typing import cast
+import heapq
 
 from ..recipe import Recipe
-from .fitness_check import strict_order_match_score
+from .fitness_check import strict_order_match_score_batch
 from .common import Contract, _parse_dependencies
+from .graph import _Graph
 
 
 type MultiPathNode = tuple[GraphNode, GraphNode, Contract]
+type Context = frozenset[tuple[Contract, ...]]
+
+class EdgePath:
+    """Immutable path of edges leading to the target, stored as a linked list.
+
+    Iterates from the edge closest to the current node towards the target.
+    Extending a path with `push` shares the existing links instead of copying them."""
+    __slots__ = ("head", "tail", "length")
+
+    EMPTY: ClassVar[EdgePath]
+
+    head: MultiPathNode
+    tail: EdgePath
+    length: int
+
+    def push(self, edge: MultiPathNode) -> EdgePath:
+        path = object.__new__(EdgePath)
+        path.head = edge
+        path.tail = self
+        path.length = self.length + 1
+        return path
+
+    def __iter__(self) -> Iterator[MultiPathNode]:
+        path = self
+        while path.length:
+            yield path.head
+            path = path.tail
+
+    def __len__(self) -> int:
+        return self.length
+
+    def __contains__(self, edge: object) -> bool:
+        return any(e == edge for e in self)
+
+EdgePath.EMPTY = object.__new__(EdgePath)
+EdgePath.EMPTY.length = 0
+
 
 @dataclass(frozen=True, eq=False)
 class GraphNode:
     recipe: type[Recipe]
-    context: set[tuple[Contract, ...]]
+    context: Context
 
 
 @dataclass
@@ -38,55 +76,109 @@ class _PlanningAlgorithm:
     when possible, and performs *splits* to isolate subgraphs when a better
     context-specific recipe appears along only some paths.
     """
-    G: nx.MultiDiGraph[GraphNode]
+    G: _Graph[GraphNode, Contract]
     target_node: GraphNode
-    queue: deque[tuple[MultiPathNode, ...]]
-    recipe_to_context: dict[type[Recipe], set[tuple[Contract, ...]]]
+    queue: deque[tuple[EdgePath, int]]
+    """Paths to process, each with the value of `removed_edges` at which it was last known to exist."""
+    removed_edges: int
+    """Number of edges removed from the graph so far. Paths are only re-checked if this changed."""
+    _path_checked_at: int
+    recipe_to_context: dict[type[Recipe], Context]
     contract_to_recipes: dict[Contract, set[type[Recipe]]]
+    recipe_to_nodes: dict[type[Recipe], list[GraphNode]]
+    """All nodes in the graph per recipe, in insertion order."""
+    _fitness_cache: dict[tuple[Context, tuple[int, ...]], float]
+    _contexts: dict[Context, Context]
+    """Canonical instance of each distinct context, so equal contexts are shared and hash once."""
+    _target_contract: Contract
+    _contract_ids: dict[Contract, int]
+    """Small integer per distinct contract. Fitness is scored on these instead of the contract tuples."""
+    _encoded_contexts: dict[Context, tuple[tuple[int, ...], ...]]
+    """Context paths of each context, encoded and reversed for scoring."""
 
     def __init__(self, target_recipe: type[Recipe], contract_to_recipes: dict[Contract, set[type[Recipe]]], recipe_to_context: dict[type[Recipe], set[tuple[Contract, ...]]]) -> None:
-        self.target_node = GraphNode(target_recipe, context={()})
-        self.G = nx.MultiDiGraph()
+        self.recipe_to_nodes = {}
+        self._contexts = {}
+        self.target_node = self.make_node(target_recipe, context=frozenset({()}))
+        self.G = _Graph()
         self.G.add_node(self.target_node)
-        self.queue = deque([()])
+        self.queue = deque([(EdgePath.EMPTY, 0)])
+        self.removed_edges = 0
+        self._path_checked_at = 0
         self.contract_to_recipes = contract_to_recipes
-        self.recipe_to_context = recipe_to_context
+        self.recipe_to_context = {r: self.intern_context(frozenset(c)) for r, c in recipe_to_context.items()}
+        self._fitness_cache = {}
+        self._contract_ids = {}
+        self._target_contract = (target_recipe._makes, None)
+        self._encoded_contexts = {}
 
     def run(self):
         while self.queue:
-            parent_path = self.queue.popleft()
-            parent_node = parent_path[0][0] if parent_path else self.target_node
+            parent_path, checked_at = self.queue.popleft()
+            parent_node = parent_path.head[0] if parent_path else self.target_node
 
-            # If the path does not exist anymore, skip
-            if not all(self.G.has_edge(*e) for e in parent_path):
+            # If the path does not exist anymore, skip. Only edge removals can invalidate it.
+            if checked_at != self.removed_edges and not all(self.G.has_edge(*e) for e in parent_path):
                 continue
+            self._path_checked_at = self.removed_edges
 
             # print()
             # print(f"PARENT NODE IS: {parent_node}")
             # print(f"LOCATION PATH IS:")
             # for x in parent_path:
                 # print(f"    {x}")
+            path_contracts = self.reversed_contracts(parent_path)
             for dep in _parse_dependencies(parent_node.recipe):
-                self.satisfy_dependency(parent_node, dep.contract, parent_path)
+                self.satisfy_dependency(parent_node, dep.contract, parent_path, path_contracts)
 
         # Finally, prune the graph to keep only nodes that can reach the target.
         # This should not happen, but just to be sure.
-        _keep = nx.ancestors(self.G, self.target_node) | {self.target_node}
-        _remove = set(self.G) - _keep
+        _keep = self.G.ancestors(self.target_node)
+        _keep.add(self.target_node)
+        _remove = [n for n in self.G if n not in _keep]
         # print(f"PRUNING {len(_remove)} nodes")
         self.G.remove_nodes_from(_remove)
+        for node in _remove:
+            self.recipe_to_nodes[node.recipe].remove(node)
+
+        return self.G.to_networkx()
+
 
-        return self.G
+    def intern_context(self, context: Context) -> Context:
+        return self._contexts.setdefault(context, context)
 
+    def contract_id(self, contract: Contract) -> int:
+        return self._contract_ids.setdefault(contract, len(self._contract_ids))
 
-    def satisfy_dependency(self, parent_node: GraphNode, contract: Contract, parent_path: tuple[MultiPathNode, ...]):
-        """Satisfy the given contract on the given parent, depending on the parent_path."""
+    def encode_context(self, context: Context) -> tuple[tuple[int, ...], ...]:
+        try:
+            return self._encoded_contexts[context]
+        except KeyError:
+            pass
+        encoded = tuple(
+            tuple(self.contract_id(c) for c in reversed(context_path))
+            for context_path in context
+        )
+        self._encoded_contexts[context] = encoded
+        return encoded
+
+    def make_node(self, recipe: type[Recipe], context: Context) -> GraphNode:
+        """Create a new node and register it in the recipe index. The caller adds it to the graph."""
+        node = GraphNode(recipe, context=self.intern_context(context))
+        self.recipe_to_nodes.setdefault(recipe, []).append(node)
+        return node
+
+
+    def satisfy_dependency(self, parent_node: GraphNode, contract: Contract, parent_path: EdgePath, path_contracts: tuple[int, ...]):
+        """Satisfy the given contract on the given parent, depending on the parent_path.
+
+        `path_contracts` are the reversed contracts of `parent_path`, see `reversed_contracts`."""
         # print(f"CONTRACT: {dep.contract}")
 
         # Pick best-fit recipe to satisfy the dependency.
         picked_recipe = self.pick_recipe(
             contract=contract,
-            path=parent_path
+            path_contracts=path_contracts,
         )
         if picked_recipe is None:
             # Format error message
@@ -100,16 +192,14 @@ class _PlanningAlgorithm:
         # Pick an existing node that we can reuse because it is just as good or even better than the picked recipe.
         reuse_node = self.pick_existing_node(
             picked_recipe=picked_recipe,
-            path=parent_path,
+            path_contracts=path_contracts,
         )
 
         # CASE 1: Contract is already fulfilled. Then check if a best-fit one was used. If not, split and use our pick or pick existing node.
         # CASE 2: Contract is not yet fulfilled. Either reuse existing node or create new node.
 
         # Get the node that is currently used to satisfy the dependency, if it exists.
-        curr_child_node = next(iter(
-            n for n, _, c in self.G.in_edges(parent_node, keys=True) if c == contract
-        ), None)
+        curr_child_node = self.G.child(parent_node, contract)
 
         if curr_child_node is None:
             # print("Contract not yet fulfilled")
@@ -120,7 +210,7 @@ class _PlanningAlgorithm:
                 # print(f"Added edge from {child_node} to {parent_node} with contract {dep.contract}")
             else:
                 # print("Could not find an existing node to reuse, creating new node")
-                child_node = GraphNode(
+                child_node = self.make_node(
                     recipe=picked_recipe.recipe,
                     context=self.recipe_to_context[picked_recipe.recipe]
                 )
@@ -128,10 +218,7 @@ class _PlanningAlgorithm:
 
         else:
             # print("Contract is already satisfied; checking if best-fit")
-            _curr_fitness = self.compute_fitness(
-                context=curr_child_node.context,
-                path=parent_path,
-            )
+            _curr_fitness = self._fitness_for_reversed(curr_child_node.context, path_contracts)
             # print("curr_child_node context:", curr_child_node.context)
             if reuse_node is not None and reuse_node.fitness > _curr_fitness:
                 # print("A different existing node is a better fit than the currently used recipe node")
@@ -164,7 +251,7 @@ class _PlanningAlgorithm:
                         context=self.recipe_to_context[picked_recipe.recipe],
                         curr_child_edge=(curr_child_node, parent_node, contract),
                 )
-                child_node = GraphNode(
+                child_node = self.make_node(
                     recipe=picked_recipe.recipe,
                     context=self.recipe_to_context[picked_recipe.recipe]
                 )
@@ -175,56 +262,79 @@ class _PlanningAlgorithm:
                 self.use_edge(child_node, parent_node, contract, parent_path=parent_path)
 
 
-    def pick_recipe(self, contract: Contract, path: Sequence[MultiPathNode]) -> RecipePick | None:
+    def pick_recipe(self, contract: Contract, path_contracts: tuple[int, ...]) -> RecipePick | None:
         """For the location given by `path`, pick a suitable recipe to satisfy `contract` that is as fitting as possible."""
 
+        recipes = self.contract_to_recipes.get(contract)
+        if not recipes:
+            return None
+
+        if len(recipes) == 1:
+            # Single candidate, no tie-breaking needed
+            (recipe,) = recipes
+            _fitness = self._fitness_for_reversed(self.recipe_to_context[recipe], path_contracts)
+            if _fitness == 0:
+                return None
+            return RecipePick(recipe=recipe, fitness=_fitness)
+
         # Compute fitness for each recipe
         max_fitness: float = 0
-        best_recipes: set[type[Recipe]] = set()
+        best_recipe: type[Recipe] | None = None
+        tied = False
 
-        if contract not in self.contract_to_recipes:
-            return None
-
-        for r in self.contract_to_recipes[contract]:
+        for r in recipes:
             _context = self.recipe_to_context[r]
-            _fitness = self.compute_fitness(_context, path)
+            _fitness = self._fitness_for_reversed(_context, path_contracts)
             if _fitness == 0:
-                # print("SKIPPING because fitness is 0")
                 continue
             if _fitness == max_fitness:
-                # print("ADDING")
-                best_recipes.add(r)
+                tied = True
             elif _fitness > max_fitness:
-                # print("ADDING")
                 max_fitness = _fitness
-                best_recipes.clear()
-                best_recipes.add(r)
+                best_recipe = r
+                tied = False
 
-        if len(best_recipes) > 1:
+        if tied:
             raise RuntimeError("Found multiple best-fit recipe records")
-        if not best_recipes:
+        if best_recipe is None:
             return None
-        best_recipe = next(iter(best_recipes))
-        
+
         return RecipePick(
             recipe=best_recipe,
             fitness=max_fitness,
         )
 
 
-    def compute_fitness(self, context: set[tuple[Contract, ...]], path: Sequence[MultiPathNode]) -> float:
-        """Score how well a recipe's context set matches the current path."""
+    def reversed_contracts(self, path: Iterable[MultiPathNode]) -> tuple[int, ...]:
+        """Encoded contracts along `path`, starting at the target and ending at the current node.
 
-        contracts_path = [c[2] for c in path] + [(self.target_node.recipe._makes, None)]
-        fitness = max(
-            strict_order_match_score(context_path[::-1], contracts_path[::-1], epsilon=1e-9, early_tie_breaker=0.1)
-            for context_path in context
-        )
+        Computed once per path and shared by all fitness checks on it."""
+        contracts = [self.contract_id(c[2]) for c in path]
+        contracts.append(self.contract_id(self._target_contract))
+        contracts.reverse()
+        return tuple(contracts)
+
+
+    def _fitness_for_reversed(self, context: Context, path_contracts: tuple[int, ...]) -> float:
+        """Score how well a recipe's context set matches the current path, given by its reversed contracts.
+
+        Memoized for the planning run, since the same context is scored against the same path many times."""
+
+        key = (context, path_contracts)
+        try:
+            return self._fitness_cache[key]
+        except KeyError:
+            pass
+
+        fitness = max(strict_order_match_score_batch(
+            self.encode_context(context), path_contracts, epsilon=1e-9, early_tie_breaker=0.1
+        ))
 
+        self._fitness_cache[key] = fitness
         return fitness
 
 
-    def compute_isolating_edge(self, context: set[tuple[Contract, ...]], parent_node: GraphNode, curr_child_node: GraphNode) -> set[MultiPathNode]:
+    def compute_isolating_edge(self, context: Context, parent_node: GraphNode, curr_child_node: GraphNode) -> set[MultiPathNode]:
         """Find a minimal set of edges that separates better-matching paths.
 
         Given the candidate context and the currently used child node, identify
@@ -247,19 +357,29 @@ class _PlanningAlgorithm:
 
         # Isolating edge of matching path P = Edge that is traversed by path P (and possibly other matching paths), but NOT by any nonmatching paths.
         # I.e., an edge that separates P from all nonmatching paths.
+        # Common case: the parent only has a single path to the target, e.g. along a freshly built chain.
+        # Then either this path matches and its first edge isolates it, or nothing needs to be isolated.
+        single_path = self.single_path_to_target(parent_node)
+        if single_path is not None:
+            _path_contracts = self.reversed_contracts(single_path)
+            _fitness = self._fitness_for_reversed(context, _path_contracts)
+            if not (_fitness > 0 and _fitness > self._fitness_for_reversed(curr_child_node.context, _path_contracts)):
+                return set()
+            if not single_path:
+                raise ValueError(f"No isolating edge for path {single_path}")
+            return {single_path[0]}
+
         matching_paths: set[tuple[MultiPathNode, ...]] = set()
 
         # Stores edges that are isolating edges for one or more paths
         isolating_edges: dict[MultiPathNode, set[tuple[MultiPathNode, ...]]] = {}
 
         nonmatching: set[MultiPathNode] = set()
-        for _path in nx.all_simple_edge_paths(self.G, parent_node, self.target_node):
-            _path = cast(list[MultiPathNode], _path)
-            _path = tuple(_path)
-            _curr_fitness = self.compute_fitness(curr_child_node.context, _path)
-            _fitness = self.compute_fitness(context, _path)
+        for _path in self.edge_paths_to_target(parent_node):
+            _path_contracts = self.reversed_contracts(_path)
+            _fitness = self._fitness_for_reversed(context, _path_contracts)
             # print(f"    Path has fitness {_fitness}")
-            if _fitness > 0 and _fitness > _curr_fitness:
+            if _fitness > 0 and _fitness > self._fitness_for_reversed(curr_child_node.context, _path_contracts):
                 # This path is matched by context.
                 # Each edge is potentially an isolating edge for the path.
                 # print("Matching path")
@@ -300,21 +420,33 @@ class _PlanningAlgorithm:
         # in the end, there are no isolating edges left. Did we cover all matching paths?
 
 
+        # Max-heap on the number of covered paths. Ties go to the edge found first, like `max()` would.
+        # Entries are not updated in place; outdated ones are skipped when popped.
+        order = {e: i for i, e in enumerate(isolating_edges)}
+        heap = [(-len(paths), order[e], e) for e, paths in isolating_edges.items()]
+        heapq.heapify(heap)
+
         picked_edges: set[MultiPathNode] = set()
         while isolating_edges:
-            best_edge = max(isolating_edges, key=lambda e: len(isolating_edges[e]))
-            assert isolating_edges[best_edge]  # cannot be empty
+            neg_count, _, best_edge = heapq.heappop(heap)
+            if len(isolating_edges.get(best_edge, ())) != -neg_count:
+                continue  # outdated entry
             picked_edges.add(best_edge)
+            touched: set[MultiPathNode] = set()
             for path in isolating_edges[best_edge].copy():
                 # Remove every path covered by this isolating edge
                 matching_paths.remove(path)
                 for e in path:
                     if e in isolating_edges:
                         isolating_edges[e].remove(path)
+                        touched.add(e)
                         if not isolating_edges[e]:
                             # remove empty sets
                             del isolating_edges[e]
             assert best_edge not in isolating_edges
+            for e in touched:
+                if e in isolating_edges:
+                    heapq.heappush(heap, (-len(isolating_edges[e]), order[e], e))
 
         # Every matching path should have been covered by an isolating edge
         if matching_paths:
@@ -329,24 +461,68 @@ class _PlanningAlgorithm:
 
 
 
-    def add_edge(self, child: GraphNode, parent: GraphNode, contract: Contract, parent_path: tuple[MultiPathNode, ...]):
+    def single_path_to_target(self, source: GraphNode) -> tuple[MultiPathNode, ...] | None:
+        """The only edge path from `source` to the target node, or None if there may be several.
+
+        Walks forward as long as each node has exactly one out-edge."""
+        path: list[MultiPathNode] = []
+        node = source
+        while node is not self.target_node:
+            parents = self.G.succ[node]
+            if len(parents) != 1:
+                return None
+            ((parent, keys),) = parents.items()
+            if len(keys) != 1:
+                return None
+            path.append((node, parent, next(iter(keys))))
+            node = parent
+        return tuple(path)
+
+
+    def edge_paths_to_target(self, source: GraphNode) -> Iterator[tuple[MultiPathNode, ...]]:
+        """Yield all simple edge paths from `source` to the target node.
+
+        Iterative DFS over out-edges, in the same order as `nx.all_simple_edge_paths`,
+        but yielding tuples directly and stopping at the target, which has no out-edges."""
+        # The target itself is handled by `single_path_to_target`
+        assert source is not self.target_node
+
+        path: list[MultiPathNode] = []
+        on_path: set[GraphNode] = {source}
+        stack = [iter(self.G.out_edges(source))]
+        while stack:
+            edge = next((e for e in stack[-1] if e[1] not in on_path), None)
+            if edge is None:
+                # All out-edges of the last node explored, backtrack
+                stack.pop()
+                if path:
+                    on_path.remove(path.pop()[1])
+                continue
+            if edge[1] is self.target_node:
+                yield (*path, edge)
+                continue
+            path.append(edge)
+            on_path.add(edge[1])
+            stack.append(iter(self.G.out_edges(edge[1])))
+
+
+    def add_edge(self, child: GraphNode, parent: GraphNode, contract: Contract, parent_path: EdgePath):
         G = self.G
 
-        satisfied_contracts = {c for _, _, c in G.in_edges(parent, keys=True)}
-        if contract in satisfied_contracts:
+        if G.child(parent, contract) is not None:
             raise ValueError(f"Contract {contract} is already satisfied for node {parent}")
-        G.add_edge(child, parent, key=contract)
+        G.add_edge(child, parent, contract)
         self.use_edge(child, parent, contract, parent_path=parent_path)
 
-    def use_edge(self, child: GraphNode, parent: GraphNode, contract: Contract, *, parent_path: tuple[MultiPathNode, ...]):
+    def use_edge(self, child: GraphNode, parent: GraphNode, contract: Contract, *, parent_path: EdgePath):
         if (child, parent, contract) in parent_path:
             raise ValueError("Cycle detected")
         self.queue.append(
-            ((child, parent, contract), *parent_path)
+            (parent_path.push((child, parent, contract)), self._path_checked_at)
         )
 
 
-    def perform_split(self, parent_node: GraphNode, isolating_edges: set[MultiPathNode], context: set[tuple[Contract, ...]], curr_child_edge: MultiPathNode) -> GraphNode:
+    def perform_split(self, parent_node: GraphNode, isolating_edges: set[MultiPathNode], context: Context, curr_child_edge: MultiPathNode) -> GraphNode:
         """Duplicate a subgraph to route better-fitting contexts.
 
         Copies the subgraph reachable from `parent_node` along the matched paths,
@@ -362,52 +538,49 @@ class _PlanningAlgorithm:
         # print()
 
         # Define subgraph to be duplicated
-        _ancestors: set[GraphNode] = set()
-        for e in isolating_edges:
-            _ancestors |= nx.ancestors(G, e[1])
-        H = cast("nx.MultiDiGraph[GraphNode]", G.subgraph(
-            (nx.descendants(G, parent_node) & _ancestors) | {parent_node}
-        ))
+        _ancestors = G.ancestors(*(e[1] for e in isolating_edges))
+        _subgraph = (G.descendants(parent_node) & _ancestors) | {parent_node}
+        H = [n for n in G if n in _subgraph]
 
         # Duplicate the subgraph nodes
         _node_copies: dict[GraphNode, GraphNode] = {
-            _n: GraphNode(_n.recipe, context=context) for _n in H.nodes
+            _n: self.make_node(_n.recipe, context=context) for _n in H
         }
-        G.add_nodes_from(_node_copies.values())
-
-        # Replicate any edges within the subgraph
-        G.add_edges_from(
-            (_node_copies[u], _node_copies[v], c) for u, v, c in set(H.edges(keys=True))
-        )
-
-        # Replicate edges going from outside into subgraph, EXCEPT for the edge currently providing the contract
-        G.add_edges_from(
-            (u, _node_copies[v], c)
-            for u, v, c in set(nx.edge_boundary(G, set(G) - set(H), set(H), keys=True))  # type: ignore
-            if (u, v, c) != curr_child_edge
-        )
+        for _n in _node_copies.values():
+            G.add_node(_n)
+
+        # Replicate the in-edges of each subgraph node in a single pass:
+        # Edges within the subgraph connect the copies,
+        # edges going from outside into the subgraph are replicated, EXCEPT for the edge currently providing the contract
+        for v in H:
+            v_copy = _node_copies[v]
+            for c, u in G.pred[v].items():
+                if u in _subgraph:
+                    G.add_edge(_node_copies[u], v_copy, c)
+                elif (u, v, c) != curr_child_edge:
+                    G.add_edge(u, v_copy, c)
         
         # Remove old isolating edge and re-insert to point to new subgraph
         for edge in isolating_edges:
             G.remove_edge(*edge)
+            self.removed_edges += 1
             G.add_edge(_node_copies[edge[0]], edge[1], edge[2])
 
         return _node_copies[parent_node]
     
 
 
-    def pick_existing_node(self, picked_recipe: RecipePick, path: Sequence[MultiPathNode]) -> ExistingNodePick | None:
+    def pick_existing_node(self, picked_recipe: RecipePick, path_contracts: tuple[int, ...]) -> ExistingNodePick | None:
         """Prefer reuse: find an existing node of same Recipe with ≥ fitness."""
 
         picked_node: GraphNode | None = None
         picked_fitness: float = 0
 
-        for node in self.G:
-            if node.recipe == picked_recipe.recipe:
-                _fitness = self.compute_fitness(node.context, path)
-                if _fitness >= picked_recipe.fitness and (picked_node is None or _fitness > picked_fitness):
-                    picked_node = node
-                    picked_fitness = _fitness
+        for node in self.recipe_to_nodes.get(picked_recipe.recipe, ()):
+            _fitness = self._fitness_for_reversed(node.context, path_contracts)
+            if _fitness >= picked_recipe.fitness and (picked_node is None or _fitness > picked_fitness):
+                picked_node = node
+                picked_fitness = _fitness
 
         if picked_node is None:
             return None
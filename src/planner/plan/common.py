@@ -16,16 +16,30 @@ class Dependency:
     contract: Contract
 
 
-def _parse_dependencies(recipe: type[Recipe]) -> list[Dependency]:
-    fields = [f for f in get_dataclass_fields(recipe) if '_injected' in f.metadata]
+def _parse_dependencies(recipe: type[Recipe]) -> tuple[Dependency, ...]:
+    """Injected dependencies of the recipe class.
+
+    Cached on the class itself, since it only depends on the class, and dropped together with it."""
     try:
-        type_hints = get_type_hints(recipe)
-    except Exception as e:
-        raise RuntimeError(f"Failed to get type hints for recipe '{recipe}'") from e
+        return recipe.__dict__['__dependencies__']
+    except KeyError:
+        pass
+
+    fields = [f for f in get_dataclass_fields(recipe) if '_injected' in f.metadata]
+
+    # Use the annotations recorded on the fields, and only resolve type hints if some of them are strings
+    type_hints: dict[str, object] | None = None
 
     deps: list[Dependency] = []
     for field in fields:
-        typ = type_hints[field.name]
+        typ = field.type
+        if isinstance(typ, str):
+            if type_hints is None:
+                try:
+                    type_hints = get_type_hints(recipe)
+                except Exception as e:
+                    raise RuntimeError(f"Failed to get type hints for recipe '{recipe}'") from e
+            typ = type_hints[field.name]
         if not (inspect.isclass(typ) and issubclass(typ, Asset)):
             raise ValueError(f"Invalid dependency '{typ}' in recipe '{recipe}': Must be a subclass of Asset")
         deps.append(Dependency(
@@ -33,4 +47,5 @@ def _parse_dependencies(recipe: type[Recipe]) -> list[Dependency]:
             contract=(typ, field.metadata['key'])
         ))
 
-    return deps
+    recipe.__dependencies__ = result = tuple(deps)  # type: ignore[attr-defined]
+    return result
@@ -1,10 +1,12 @@
 from __future__ import annotations
 from dataclasses import dataclass
-from collections.abc import Sequence
+from collections.abc import Sequence, Callable
+import heapq
+from concurrent.futures import Future, ThreadPoolExecutor, wait, FIRST_COMPLETED
 import networkx as nx
 import logging
 from typing import Self, TYPE_CHECKING
-from contextlib import ExitStack
+from contextlib import AbstractContextManager
 
 from ..asset import Asset
 from .common import _parse_dependencies, Contract
@@ -17,10 +19,12 @@ log = logging.getLogger(__name__)
 @dataclass(frozen=True)
 class AssetRecord[T: Asset]:
     asset: T
-    stack: ExitStack
+    exit: Callable[..., object] | None = None
+    """`__exit__` of the context manager the recipe produced, if any."""
 
     def _cleanup(self, exc_type=None, exc=None, tb=None):
-        self.stack.__exit__(exc_type, exc, tb)
+        if self.exit is not None:
+            self.exit(exc_type, exc, tb)
 
 
 class PlanExecution:
@@ -29,18 +33,45 @@ class PlanExecution:
     Builds nodes in topological order, resolves each recipe's working directory,
     instantiates recipe objects with injected dependencies, and captures the
     produced assets. On exit/cleanup, resources are released in reverse order.
+
+    With `max_workers > 1`, independent nodes are built concurrently in a thread pool
+    as soon as all of their inputs are available. Recipes must then be thread-safe.
     """
     def __init__(
         self,
         graph: nx.MultiDiGraph[GraphNode],
         seq: Sequence[GraphNode],
-        defer_cleanup: bool = False  # Unload and cleanup assets as soon as they are not needed anymore
+        defer_cleanup: bool = False,  # Unload and cleanup assets as soon as they are not needed anymore
+        max_workers: int = 1
     ) -> None:
+        if max_workers < 1:
+            raise ValueError(f"max_workers must be at least 1, got {max_workers}")
         self.graph = graph
         self.seq = seq
         self.node_to_asset: dict[GraphNode, AssetRecord] = {}
         self.defer_cleanup = defer_cleanup
+        self.max_workers = max_workers
         self._cleanup_errors: list[Exception] = []
+
+        # in-edges of each node as (providing node, contract), and number of out-edges
+        # read from the adjacency dicts directly instead of through networkx edge views
+        self._in_edges: dict[GraphNode, tuple[tuple[GraphNode, Contract], ...]] = {
+            node: tuple((u, c) for u, keys in graph.pred[node].items() for c in keys)
+            for node in seq
+        }
+        self._out_degree: dict[GraphNode, int] = {
+            node: sum(len(keys) for keys in graph.succ[node].values())
+            for node in seq
+        }
+
+        # recipe argument name and providing node for each dependency, per node
+        self._node_inputs: dict[GraphNode, list[tuple[str, GraphNode]]] = {}
+        for node in seq:
+            providers = {c: u for u, c in self._in_edges[node]}
+            self._node_inputs[node] = [
+                (dep.name, providers[dep.contract])
+                for dep in _parse_dependencies(node.recipe)
+            ]
     
     @property
     def target(self):
@@ -65,41 +96,95 @@ class PlanExecution:
         log.info("Starting plan execution")
 
         # remaining downstream contract-uses
-        remaining_uses = {n: self.graph.out_degree(n) for n in self.seq}
-
-        for node in self.seq:
-            rec = self._build_node(node)
-            self.node_to_asset[node] = rec
-
-            # after building this node, its inputs might be freeable
-            for u, _, _ in self.graph.in_edges(node, keys=True):
-                remaining_uses[u] -= 1
-                assert remaining_uses[u] >= 0  # cannot be negative
-
-                if not self.defer_cleanup and remaining_uses[u] == 0 and u is not self.target:
-                    # Unregister loaded asset
-                    rec = self.node_to_asset.pop(u, None)
-                    if rec is None:
-                        continue
-
-                    # Clean up asset
-                    log.debug(f"Cleaning up {u}")
-                    try:
-                        rec._cleanup(None, None, None)
-                    except Exception as e:
-                        log.exception(f"Cleanup failed for {u}")
-                        self._cleanup_errors.append(e)
+        remaining_uses = dict(self._out_degree)
+
+        if self.max_workers == 1:
+            for node in self.seq:
+                self.node_to_asset[node] = self._build_node(node)
+                self._release_inputs(node, remaining_uses)
+        else:
+            self._run_parallel(remaining_uses)
 
         return self.node_to_asset[self.target]
 
 
+    def _run_parallel(self, remaining_uses: dict[GraphNode, int]):
+        """Build nodes in a thread pool, submitting each node once all of its inputs are built.
+
+        Ready nodes on the most expensive remaining path are submitted first, so the critical path starts early.
+        All bookkeeping happens in the calling thread; workers only run `_build_node`."""
+        # cost of the most expensive path from each node to the target, including the node itself
+        rank: dict[GraphNode, float] = {}
+        for node in reversed(self.seq):
+            rank[node] = node.recipe._estimated_cost + max(
+                (rank[v] for v in self.graph.succ[node]), default=0
+            )
+
+        # remaining upstream contracts per node
+        pending = {n: len(self._in_edges[n]) for n in self.seq}
+        # max-heap on rank, ties in topological order
+        order = {n: i for i, n in enumerate(self.seq)}
+        ready = [(-rank[n], order[n], n) for n in self.seq if pending[n] == 0]
+        heapq.heapify(ready)
+        running: dict[Future[AssetRecord], GraphNode] = {}
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            try:
+                while ready or running:
+                    # Only fill free workers, so that nodes becoming ready later can still overtake by rank
+                    while ready and len(running) < self.max_workers:
+                        _, _, node = heapq.heappop(ready)
+                        running[pool.submit(self._build_node, node)] = node
+
+                    done, _ = wait(running, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        node = running.pop(future)
+                        self.node_to_asset[node] = future.result()
+                        self._release_inputs(node, remaining_uses)
+
+                        # unblock consumers whose inputs are now all built
+                        for v, keys in self.graph.succ[node].items():
+                            pending[v] -= len(keys)
+                            if pending[v] == 0:
+                                heapq.heappush(ready, (-rank[v], order[v], v))
+            except BaseException:
+                # Do not start anything new, and register what already got built so that it is cleaned up
+                for future in running:
+                    future.cancel()
+                for future, node in running.items():
+                    if not future.cancelled() and future.exception() is None:
+                        self.node_to_asset[node] = future.result()
+                raise
+
+
+    def _release_inputs(self, node: GraphNode, remaining_uses: dict[GraphNode, int]):
+        """After building `node`, clean up its inputs that are not needed anymore."""
+        for u, _ in self._in_edges[node]:
+            remaining_uses[u] -= 1
+            assert remaining_uses[u] >= 0  # cannot be negative
+
+            if not self.defer_cleanup and remaining_uses[u] == 0 and u is not self.target:
+                # Unregister loaded asset
+                rec = self.node_to_asset.pop(u, None)
+                if rec is None:
+                    continue
+
+                # Clean up asset
+                log.debug(f"Cleaning up {u}")
+                try:
+                    rec._cleanup(None, None, None)
+                except Exception as e:
+                    log.exception(f"Cleanup failed for {u}")
+                    self._cleanup_errors.append(e)
+
+
     def cleanup(self):
         self._cleanup(None, None, None)
 
     def _cleanup(self, exc_type=None, exc=None, tb=None):
         log.info("Cleaning up assets")
 
-        for node in self.seq[::-1]:
+        for node in reversed(self.seq):
             # Unregister loaded asset
             rec = self.node_to_asset.pop(node, None)
             if rec is None:
@@ -121,43 +206,35 @@ class PlanExecution:
 
     def _build_node(self, node: GraphNode) -> AssetRecord:
         _Recipe = node.recipe
-        stack = ExitStack()
 
-        try:
-            # create dependencies
-            input_assets: dict[Contract, AssetRecord[Asset]] = {
-                c: self.node_to_asset[u]
-                for u, _, c in self.graph.in_edges(node, keys=True)
-            }
-            recipe_kwargs: dict[str, Asset] = {
-                dep.name: input_assets[dep.contract].asset
-                for dep in _parse_dependencies(_Recipe)
-            }
-
-            recipe_instance = _Recipe(**recipe_kwargs)
-            _Asset = _Recipe._makes
+        # create dependencies
+        recipe_kwargs: dict[str, Asset] = {
+            name: self.node_to_asset[u].asset
+            for name, u in self._node_inputs[node]
+        }
+
+        recipe_instance = _Recipe(**recipe_kwargs)
+        _Asset = _Recipe._makes
 
+        try:
+            _res = recipe_instance.make()
+        except Exception as e:
+            raise RuntimeError(f"Failed to make asset '{_Asset}' with recipe '{_Recipe}'") from e
+
+        if isinstance(_res, Asset):
+            # nothing to clean up
+            return AssetRecord(asset=_res)
+
+        # The ABC's subclass hook checks the type for `__enter__`/`__exit__`, and caches the result per type
+        if isinstance(_res, AbstractContextManager):
+            # Enter like `ExitStack.enter_context` would, but keep only the bound `__exit__`
+            _cm_type = type(_res)
             try:
-                _res = recipe_instance.make()
+                asset = _cm_type.__enter__(_res)
             except Exception as e:
                 raise RuntimeError(f"Failed to make asset '{_Asset}' with recipe '{_Recipe}'") from e
 
-            if isinstance(_res, Asset):
-                # transfer ownership of cleanup to the AssetRecord via stack
-                return AssetRecord(asset=_res, stack=stack)
-
-            is_context_manager = callable(getattr(_res, "__enter__", None)) and callable(getattr(_res, "__exit__", None))
-            if is_context_manager:
-                try:
-                    asset = stack.enter_context(_res)
-                except Exception as e:
-                    raise RuntimeError(f"Failed to make asset '{_Asset}' with recipe '{_Recipe}'") from e
-
-                # Transfer ownership: AssetRecord will close the stack during cleanup
-                return AssetRecord(asset=asset, stack=stack)
-
-            raise TypeError(f"Recipe '{_Recipe}' produced an asset of invalid type {type(_res)}")
+            # Transfer ownership: AssetRecord will exit the context manager during cleanup
+            return AssetRecord(asset=asset, exit=_cm_type.__exit__.__get__(_res))
 
-        except Exception:
-            stack.close()
-            raise
+        raise TypeError(f"Recipe '{_Recipe}' produced an asset of invalid type {type(_res)}")
@@ -1,40 +1,54 @@
 from collections.abc import Sequence
+from bisect import bisect_left, bisect_right
 
 
-def best_subsequence_window(context, seq):
+def precompute_positions(seq):
+    """Map each element of `seq` to the ascending indices at which it occurs.
+
+    Can be passed to `best_subsequence_window` / `strict_order_match_score`
+    when the same sequence is matched against many contexts."""
+    positions = {}
+    for i, x in enumerate(seq):
+        positions.setdefault(x, []).append(i)
+    return positions
+
+
+def best_subsequence_window(context, seq, positions=None):
     m, n = len(context), len(seq)
     if m == 0:
         return (0, -1)
 
+    if positions is None:
+        positions = precompute_positions(seq)
+
+    # occurrences of each context element; jump between them instead of scanning seq
+    occurrences = []
+    for c in context:
+        if c not in positions:
+            return None
+        occurrences.append(positions[c])
+
     best = None
     i = 0
     while True:
-        # forward scan to complete context
-        ci = 0
+        # forward jumps to complete context
         j = i
-        while j < n and ci < m:
-            if seq[j] == context[ci]:
-                ci += 1
-            j += 1
-        if ci < m:
-            break  # no completion from i
+        for occ in occurrences:
+            k = bisect_left(occ, j)
+            if k == len(occ):
+                return best  # no completion from i
+            j = occ[k] + 1
 
         end = j - 1
 
-        # backward tighten
-        ci = m - 1
+        # backward jumps to tighten
         k = end
-        start = None
-        while k >= i:
-            if seq[k] == context[ci]:
-                ci -= 1
-                if ci < 0:
-                    start = k
-                    break
-            k -= 1
-
-        if start is None:
-            return best  # safety
+        for occ in reversed(occurrences):
+            idx = bisect_right(occ, k) - 1
+            if idx < 0 or occ[idx] < i:
+                return best  # safety
+            k = occ[idx] - 1
+        start = k + 1
 
         if best is None or (end - start) < (best[1] - best[0]):
             best = (start, end)
@@ -48,7 +62,8 @@ def best_subsequence_window(context, seq):
 def strict_order_match_score(context, edge_path_keys,
                              length_weight=1.0,
                              early_tie_breaker=0.0,
-                             epsilon=1e-9) -> float:
+                             epsilon=1e-9,
+                             positions=None) -> float:
     """
     Returns float in [0,1].
     - 0 if `context` is NOT a subsequence of `edge_path_keys`.
@@ -56,6 +71,7 @@ def strict_order_match_score(context, edge_path_keys,
       where coverage = (len(context)+epsilon)/(len(seq)+epsilon),
             compactness = 1/(1+gaps) using the SHORTEST window containing the subsequence.
     - If context is empty: returns a tiny positive ≈ epsilon/(n+epsilon).
+    `positions` may be the precomputed result of `precompute_positions(edge_path_keys)`.
     """
     m, n = len(context), len(edge_path_keys)
 
@@ -64,7 +80,7 @@ def strict_order_match_score(context, edge_path_keys,
         coverage = (epsilon / (n + epsilon)) ** max(1.0, float(length_weight)) if n > 0 else 1.0
         return coverage  # compactness=1, no gaps
 
-    win = best_subsequence_window(context, edge_path_keys)
+    win = best_subsequence_window(context, edge_path_keys, positions)
     if win is None:
         return 0.0
 
@@ -82,6 +98,20 @@ def strict_order_match_score(context, edge_path_keys,
     return base
 
 
+def strict_order_match_score_batch(contexts, edge_path_keys,
+                                   length_weight=1.0,
+                                   early_tie_breaker=0.0,
+                                   epsilon=1e-9) -> list[float]:
+    """`strict_order_match_score` of each context against the same `edge_path_keys`.
+
+    The position table of `edge_path_keys` is built once and shared by all contexts."""
+    positions = precompute_positions(edge_path_keys)
+    return [
+        strict_order_match_score(context, edge_path_keys, length_weight, early_tie_breaker, epsilon, positions)
+        for context in contexts
+    ]
+
+
 
 # score = strict_order_match_score(
 #     list(),
@@ -0,0 +1,106 @@
+from __future__ import annotations
+from collections.abc import Callable, Hashable, Iterable, Iterator
+from collections import deque
+import networkx as nx
+
+
+class _Graph[N: Hashable, K: Hashable]:
+    """Minimal directed multigraph used while planning.
+
+    Edges point from a child (dependency) to its parent and are identified by a key.
+    Each node has at most one in-edge per key, since a contract is satisfied by a single child.
+    Unlike `nx.MultiDiGraph`, no attribute dicts are allocated per node or edge.
+
+    Out-edges are grouped by target node and iterate in the same order as in networkx.
+    """
+    __slots__ = ("succ", "pred")
+
+    succ: dict[N, dict[N, dict[K, None]]]
+    """node -> parent -> keys of the edges from node to parent"""
+    pred: dict[N, dict[K, N]]
+    """node -> key -> child"""
+
+    def __init__(self) -> None:
+        self.succ = {}
+        self.pred = {}
+
+    def __iter__(self) -> Iterator[N]:
+        return iter(self.succ)
+
+    def __len__(self) -> int:
+        return len(self.succ)
+
+    def __contains__(self, node: object) -> bool:
+        return node in self.succ
+
+    def add_node(self, node: N):
+        if node not in self.succ:
+            self.succ[node] = {}
+            self.pred[node] = {}
+
+    def add_edge(self, u: N, v: N, key: K):
+        self.add_node(u)
+        self.add_node(v)
+        if key in self.pred[v]:
+            raise ValueError(f"Node {v} already has an in-edge with key {key}")
+        self.pred[v][key] = u
+        self.succ[u].setdefault(v, {})[key] = None
+
+    def remove_edge(self, u: N, v: N, key: K):
+        if self.pred[v].get(key) is not u:
+            raise KeyError(f"Edge {(u, v, key)} not in graph")
+        del self.pred[v][key]
+        keys = self.succ[u][v]
+        del keys[key]
+        if not keys:
+            del self.succ[u][v]
+
+    def has_edge(self, u: N, v: N, key: K) -> bool:
+        preds = self.pred.get(v)
+        return preds is not None and key in preds and preds[key] is u
+
+    def remove_nodes_from(self, nodes: Iterable[N]):
+        for node in nodes:
+            for key, u in list(self.pred[node].items()):
+                self.remove_edge(u, node, key)
+            for v, keys in list(self.succ[node].items()):
+                for key in list(keys):
+                    self.remove_edge(node, v, key)
+            del self.succ[node]
+            del self.pred[node]
+
+    def child(self, node: N, key: K) -> N | None:
+        """The node connected to `node` by the in-edge with `key`, if any."""
+        return self.pred[node].get(key)
+
+    def out_edges(self, node: N) -> Iterator[tuple[N, N, K]]:
+        return ((node, v, key) for v, keys in self.succ[node].items() for key in keys)
+
+    def edges(self) -> Iterator[tuple[N, N, K]]:
+        return (e for node in self.succ for e in self.out_edges(node))
+
+    def ancestors(self, *nodes: N) -> set[N]:
+        """All nodes from which any of `nodes` is reachable through at least one edge."""
+        return self._reachable(nodes, lambda n: self.pred[n].values())
+
+    def descendants(self, *nodes: N) -> set[N]:
+        """All nodes reachable from any of `nodes` through at least one edge."""
+        return self._reachable(nodes, lambda n: self.succ[n].keys())
+
+    def _reachable(self, sources: Iterable[N], neighbors: Callable[[N], Iterable[N]]) -> set[N]:
+        # Single BFS seeded with all sources. In a DAG, a source is only included if reachable from another one.
+        seen: set[N] = set()
+        queue = deque(sources)
+        while queue:
+            for n in neighbors(queue.popleft()):
+                if n not in seen:
+                    seen.add(n)
+                    queue.append(n)
+        return seen
+
+    def to_networkx(self) -> nx.MultiDiGraph[N]:
+        G: nx.MultiDiGraph[N] = nx.MultiDiGraph()
+        G.add_nodes_from(self.succ)
+        for u, v, key in self.edges():
+            G.add_edge(u, v, key=key)
+        return G
@@ -4,10 +4,9 @@ from contextlib import contextmanager
 import networkx as nx
 from pathlib import Path
 import logging
-import random
 from typing import TYPE_CHECKING
 from collections.abc import Generator
-from matplotlib import pyplot as plt
+from collections import deque
 
 from ..asset import Asset
 from .execution import PlanExecution
@@ -17,6 +16,24 @@ if TYPE_CHECKING:
 log = logging.getLogger(__name__)
 
 
+def _kahn_topo[N](graph: nx.MultiDiGraph[N]) -> list[N]:
+    """Topological order of `graph` using Kahn's algorithm, without the generality of `nx.topological_sort`."""
+    in_deg: dict[N, int] = dict(graph.in_degree())
+    queue = deque(n for n, d in in_deg.items() if d == 0)
+    order: list[N] = []
+    while queue:
+        u = queue.popleft()
+        order.append(u)
+        for v, keys in graph.succ[u].items():
+            # each parallel edge counts towards the in-degree
+            in_deg[v] -= len(keys)
+            if in_deg[v] == 0:
+                queue.append(v)
+    if len(order) != len(in_deg):
+        raise ValueError("Graph contains a cycle")
+    return order
+
+
 @dataclass
 class DrawCounter:
     value: int = 0
@@ -39,23 +56,32 @@ class Plan[T: Asset]:
       - `draw()` to persist a labeled visualization of the DAG (for debugging).
     """
     def __init__(self, graph: nx.MultiDiGraph[GraphNode]) -> None:
-        assert nx.is_directed_acyclic_graph(graph)
-        _target_nodes = {node for node, deg in graph.out_degree if deg == 0}
-        assert len(_target_nodes) == 1
+        if __debug__:
+            # Sanity checks, skipped with `python -O`. The planning algorithm only produces valid graphs.
+            assert nx.is_directed_acyclic_graph(graph)
+            _num_targets = 0
+            for node, succ in graph.succ.items():
+                if not succ:
+                    _num_targets += 1
+                    if _num_targets > 1:
+                        break
+            assert _num_targets == 1
         self.graph = graph
 
 
     @contextmanager
-    def run(self, defer_cleanup: bool = False) -> Generator[T]:
+    def run(self, defer_cleanup: bool = False, max_workers: int = 1) -> Generator[T]:
         """Execute the plan, yielding the final built Asset.
 
         All upstream assets (including generator-based recipes) are cleaned up
-        when the context exits, in reverse topological order."""
-        order = list(nx.topological_sort(self.graph))
+        when the context exits, in reverse topological order.
+        With `max_workers > 1`, independent recipes are made concurrently in threads."""
+        order = _kahn_topo(self.graph)
         with PlanExecution(
             graph=self.graph,
             seq=order,
-            defer_cleanup=defer_cleanup
+            defer_cleanup=defer_cleanup,
+            max_workers=max_workers
         ) as e:
             record = e.run()
             yield record.asset
@@ -63,6 +89,13 @@ class Plan[T: Asset]:
     
     def draw(self, folder: Path | str = "."):
         """Save a PNG of the DAG using a layered (multipartite) layout."""
+        # Only needed for drawing, and matplotlib is slow to import
+        import random
+        try:
+            from matplotlib import pyplot as plt
+        except ImportError as e:
+            raise ImportError("Drawing a plan requires matplotlib to be installed") from e
+
         folder = Path(folder)
 
         log.info("Drawing plan")
@@ -87,12 +120,15 @@ class Plan[T: Asset]:
         for _, t in text.items():
             t.set_rotation('vertical')
 
-        _labels: dict[tuple[GraphNode, GraphNode], str] = {}
+        # Collect the label parts per node pair and join once, instead of concatenating per edge
+        _label_parts: dict[tuple[GraphNode, GraphNode], list[str]] = {}
         for u, v, c in G.edges(keys=True):
-            if (u, v) in _labels:
-                _labels[(u, v)] += f",{c[1]}"
+            parts = _label_parts.get((u, v))
+            if parts is None:
+                _label_parts[(u, v)] = [f"{str(c[0]).removesuffix("Asset")}-{c[1]}"]
             else:
-                _labels[(u, v)] = f"{str(c[0]).removesuffix("Asset")}-{c[1]}"
+                parts.append(str(c[1]))
+        _labels = {k: ",".join(parts) for k, parts in _label_parts.items()}
         text = nx.draw_networkx_edge_labels(G, pos=pos, ax=ax, rotate=True, edge_labels=_labels, font_size=4)
         # for _, t in text.items():
         #     t.set_rotation('vertical')
@@ -3,13 +3,14 @@ import logging
 from collections.abc import Sequence, Set
 from typing import Any, cast, Union
 import itertools as it
+import networkx as nx
 
 from ..asset import Asset
 from ..utils import is_asset_class
 from ..recipe import Recipe, RecipeBundle
 from .common import Contract
 from .plan import Plan
-from .algorithm import _PlanningAlgorithm
+from .algorithm import _PlanningAlgorithm, GraphNode
 
 log = logging.getLogger(__name__)
 
@@ -27,13 +28,26 @@ type ContractDef = Union[
 
 
 def resolve_contract_def(cdef: ContractDef) -> set[Contract]:
+    return set(_resolve_contract_def(cdef))
+
+
+def _freeze(cdef: Any) -> Any:
+    """Recursively turn sets into frozensets, so that contract defs can be used as cache keys."""
+    if isinstance(cdef, Set):
+        return frozenset(_freeze(c) for c in cdef)
+    if isinstance(cdef, tuple):
+        return tuple(_freeze(c) for c in cdef)
+    return cdef
+
+
+def _resolve_contract_def(cdef: ContractDef) -> frozenset[Contract]:
     if is_asset_class(cdef):
         # Single asset
-        return {(cdef, None)}
+        return frozenset({(cdef, None)})
 
     # Check if set of asset classes
     if isinstance(cdef, Set) and cdef and all(is_asset_class(c) for c in cdef):
-        return {(asset, None) for asset in cdef}
+        return frozenset((asset, None) for asset in cdef)
 
     # Cdef is 2-tuple
     if not isinstance(cdef, tuple) or len(cdef) != 2:
@@ -57,7 +71,7 @@ def resolve_contract_def(cdef: ContractDef) -> set[Contract]:
         else:
             raise ValueError("Invalid input")
 
-    return set(it.product(assets, keys))
+    return frozenset(it.product(assets, keys))
 
 
 class Planner:
@@ -75,10 +89,19 @@ class Planner:
     recipe_to_context: dict[type[Recipe], set[tuple[Contract, ...]]]
     # Each contract may have one or more recipes
     contract_to_recipes: dict[Contract, set[type[Recipe]]]
+    # Planned graph per target recipe, valid until recipes are added
+    _plan_cache: dict[type[Recipe], nx.MultiDiGraph[GraphNode]]
+    # Resolved contract defs, with sets frozen. Recipes often share the same contract defs.
+    _contract_def_cache: dict[ContractDef, frozenset[Contract]]
+    # Canonical instance of each contract, so that equal contracts are shared and compare by identity first
+    _contracts: dict[Contract, Contract]
 
     def __init__(self) -> None:
         self.contract_to_recipes = {}
         self.recipe_to_context = {}
+        self._plan_cache = {}
+        self._contract_def_cache = {}
+        self._contracts = {}
 
     # def set_base_recipe(self, recipe: type[Recipe])
 
@@ -91,21 +114,46 @@ class Planner:
             self._add(recipe, key=key, context=context)
         return self
 
+    def invalidate(self):
+        """Forget previously planned graphs. Needed if the registrations were modified other than through `add()`."""
+        self._plan_cache.clear()
+
+    def _resolve_contract_def(self, cdef: ContractDef) -> frozenset[Contract]:
+        frozen = _freeze(cdef)
+        try:
+            return self._contract_def_cache[frozen]
+        except KeyError:
+            pass
+        except TypeError:
+            raise ValueError("Invalid input") from None
+        contracts = frozenset(self._intern_contract(c) for c in _resolve_contract_def(frozen))
+        self._contract_def_cache[frozen] = contracts
+        return contracts
+
+    def _intern_contract(self, contract: Contract) -> Contract:
+        return self._contracts.setdefault(contract, contract)
+
     def _add(self, recipe: type[Recipe], key: str | None, context: ContractDef | Sequence[ContractDef]):
+        self.invalidate()
+
         context_paths: set[tuple[Contract, ...]]
         try:
             # Single contract def
-            contracts = resolve_contract_def(context)  # type: ignore
+            contracts = self._resolve_contract_def(context)  # type: ignore
             context_paths = {(contract, ) for contract in contracts}
         except Exception:
             # Context is sequence of contractdef
             context = cast(Sequence[ContractDef], context)
-            parts = [resolve_contract_def(elem) for elem in context]
-            context_paths = set(it.product(*parts))
+            parts = [self._resolve_contract_def(elem) for elem in context]
+            if len(parts) == 1:
+                context_paths = {(contract, ) for contract in parts[0]}
+            else:
+                # Hash the paths as they are generated
+                context_paths = set(it.product(*parts))
         assert context_paths
 
         # Register under contract
-        contract = (recipe._makes, key)
+        contract = self._intern_contract((recipe._makes, key))
         if contract not in self.contract_to_recipes:
             self.contract_to_recipes[contract] = set()
         self.contract_to_recipes[contract].add(recipe)
@@ -119,7 +167,7 @@ class Planner:
 
 
     def plan[T: Asset](self, asset: type[T], key: str | None = None) -> Plan[T]:
-        target_contract = (asset, key)
+        target_contract = self._intern_contract((asset, key))
 
         # Determine target recipe. Must match the empty context path.
         _target_recipes = {r for r in self.contract_to_recipes.get(target_contract, []) if () in self.recipe_to_context[r]}
@@ -129,7 +177,13 @@ class Planner:
             raise ValueError(f"Missing recipe for target asset {target_contract}")
         target_recipe = next(iter(_target_recipes))
 
-        log.info("Creating plan")
-        algo = _PlanningAlgorithm(target_recipe=target_recipe, contract_to_recipes=self.contract_to_recipes, recipe_to_context=self.recipe_to_context)
-        G = algo.run()
-        return Plan(G)
+        G = self._plan_cache.get(target_recipe)
+        if G is None:
+            log.info("Creating plan")
+            algo = _PlanningAlgorithm(target_recipe=target_recipe, contract_to_recipes=self.contract_to_recipes, recipe_to_context=self.recipe_to_context)
+            G = self._plan_cache[target_recipe] = algo.run()
+        else:
+            log.info("Reusing plan")
+
+        # Copy, since plans may modify their graph
+        return Plan(G.copy())
@@ -3,6 +3,7 @@ from abc import ABC, abstractmethod, ABCMeta
 from dataclasses import dataclass, field, Field, fields
 from typing import ClassVar, Any, cast, dataclass_transform, ContextManager
 from collections.abc import Collection
+from weakref import WeakValueDictionary
 
 from .caps import Cap
 from .asset import Asset
@@ -72,17 +73,25 @@ class Recipe[T: Asset](_Dataclass, ABC, metaclass=_RecipeMeta):
     _caps: ClassVar[Collection[Cap]]  = []  # override
     """The capabilities/settings of the recipe. These may be read by assets."""
 
+    _estimated_cost: ClassVar[float] = 1  # override
+    """Rough relative cost of `make()`. Used to prioritize long dependency chains when executing in parallel."""
+
     @abstractmethod
     def make(self) -> T | ContextManager[T]:
         """Build the asset. See class docstring for return/generator semantics."""
         ...
 
 
+_STATIC_RECIPES: WeakValueDictionary[int, type[Recipe]] = WeakValueDictionary()
+"""Recipe classes created by `StaticRecipe`, keyed by the id of their asset."""
+
+
 def StaticRecipe[T: Asset](asset: T) -> type[Recipe[T]]:
     """
     Create a trivial Recipe class that always returns the given `asset`.
 
     Useful for testing or for pinning a precomputed asset into the repository.
+    Repeated calls with the same asset object return the same class.
 
     Example:
     ```
@@ -91,7 +100,11 @@ def StaticRecipe[T: Asset](asset: T) -> type[Recipe[T]]:
     repo.add(TurbinesStatic)  # registers a recipe that just returns `turbines`
     ```
     """
-    
+    # The class keeps the asset alive, so its id cannot be reused while the entry exists
+    cached = _STATIC_RECIPES.get(id(asset))
+    if cached is not None and cached._asset is asset:  # type: ignore[attr-defined]
+        return cached
+
     asset_type = type(asset)
     class _StaticRecipe(Recipe[T]):
         _makes = asset_type
@@ -102,23 +115,23 @@ def StaticRecipe[T: Asset](asset: T) -> type[Recipe[T]]:
     
     # Optional: Better name for debugging
     _StaticRecipe.__name__ = f"StaticRecipe[{asset_type.__name__}]"
-    
+
+    _STATIC_RECIPES[id(asset)] = _StaticRecipe
     return _StaticRecipe
 
 
 class RecipeBundle:
     """Collection of recipes, optionally together with their respective keys under which they provide their assets."""
 
-    recipes: set[
-        tuple[type[Recipe], str | None]
+    recipes: dict[
+        tuple[type[Recipe], str | None], None
     ]
-    """(Recipe, key) tuples"""
+    """(Recipe, key) tuples, deduplicated in insertion order"""
 
     def __init__(self, recipes: Collection[type[Recipe] | tuple[type[Recipe], str]]) -> None:
-        self.recipes = {
-            r if isinstance(r, tuple) else (r, None)
-            for r in recipes
-        }
+        self.recipes = {}
+        for r in recipes:
+            self.recipes[r if isinstance(r, tuple) else (r, None)] = None
 
     def __repr__(self) -> str:
         return f"RecipeBundle[{', '.join(map(repr, self.recipes))}]"
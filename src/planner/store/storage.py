@@ -1,13 +1,17 @@
 from planner import Recipe, Asset, inject, Caps
 from planner.caps import Cap, ContextCap
-from tempfile import TemporaryDirectory
-from dataclasses import dataclass, asdict, astuple
+from tempfile import TemporaryDirectory, mkdtemp
+from dataclasses import dataclass, field, asdict, astuple
 from contextlib import contextmanager, ExitStack
 from pathlib import Path
+import os
+import hashlib
+import threading
 from enum import Enum, auto
+from typing import Final, cast
 
 
-@dataclass(frozen=True)
+@dataclass(frozen=True, slots=True)
 class StorageCap(Cap):
     tag: str | None = None
 
@@ -18,17 +22,88 @@ class StorageCap(Cap):
     - project-specific (`False`; default).
     """
 
+    follow_symlinks: bool = False
+    """Resolve symlinks in the storage path, even if the storage root is trusted not to contain any."""
+
+    shard_bits: int = 0
+    """
+    Number of bits of the tag's hash used to place the directory in an intermediate shard directory,
+    e.g. `shared/3f/<tag>` for 8 bits. Avoids a single large directory if there are many tags. `0` disables sharding.
+    """
+
+    def __post_init__(self):
+        if not 0 <= self.shard_bits <= 32:
+            raise ValueError(f"shard_bits must be between 0 and 32, got {self.shard_bits}")
+
+
+_DEFAULT_STORAGE_CAP: Final = StorageCap()
+"""Used if no `StorageCap` is given. Caps are frozen, so a single instance can be shared."""
+
+
+def _mkdir(path: Path, parents: bool = False):
+    """Create a directory if it does not exist yet.
+
+    Tries `os.mkdir` first, so that only an already existing path needs an extra check that it is a directory."""
+    try:
+        os.mkdir(path)
+    except FileExistsError:
+        if not os.path.isdir(path):
+            raise
+    except FileNotFoundError:
+        if not parents:
+            raise
+        os.makedirs(path, exist_ok=True)
+
+
+def _shard(tag: str, bits: int) -> str:
+    """Name of the shard directory for `tag`: the top `bits` bits of its hash, in hex."""
+    digest = int.from_bytes(hashlib.blake2b(tag.encode(), digest_size=4).digest())
+    return format(digest >> (32 - bits), f'0{(bits + 3) // 4}x')
+
+
+def _persistent_dir_path(root: str, project: str | None, tag: str, shared: bool, shard_bits: int = 0) -> str:
+    """Path of a persistent dir below `root`, neither normalized nor resolved."""
+    base = os.path.join(root, 'shared') if shared else os.path.join(root, 'projects', cast(str, project))
+    return os.path.join(base, _shard(tag, shard_bits), tag) if shard_bits else os.path.join(base, tag)
+
 
 class CacheKey(Enum):
     TEMPDIR = auto()
     PERSISTENT_DIR = auto()
 
-@dataclass
+@dataclass(slots=True, weakref_slot=True)
 class StorageProviderAsset(Asset):
     """Provides both persistent and temporary storage to recipes."""
     _root: Path
     _project: str | None
     _exitstack: ExitStack
+    _trusted: bool = False
+    """Whether the root is trusted not to contain symlinks. Then paths are normalized lexically instead of resolved."""
+    _persistent_dirs: dict[tuple[str, bool, bool, int], Path] = field(default_factory=dict, init=False, repr=False)
+    """Directories already resolved and created, shared by all recipes using this provider."""
+    _created_dirs: set[Path] = field(default_factory=set, init=False, repr=False)
+    """Directories known to exist, including the parents of created directories."""
+    _temp_root: Path | None = field(default=None, init=False, repr=False)
+    """Single temporary directory containing all tempdirs, removed as a whole when the provider is closed."""
+    _temp_root_lock: threading.Lock = field(default_factory=threading.Lock, init=False, repr=False)
+    """Guards the lazy creation of `_temp_root`, since recipes may run in parallel threads."""
+    _root_strs: dict[bool, tuple[str, str]] = field(default_factory=dict, init=False, repr=False)
+    """String form of the root without and with a trailing separator, for the root as given and resolved."""
+
+    def _root_strings(self, resolved: bool = False) -> tuple[str, str]:
+        try:
+            return self._root_strs[resolved]
+        except KeyError:
+            pass
+        root_str = str(self._root.resolve() if resolved else self._root)
+        self._root_strs[resolved] = (root_str, os.path.join(root_str, ''))
+        return self._root_strs[resolved]
+
+    def _is_within_root(self, path: Path, resolved: bool = False) -> bool:
+        """Check containment by string prefix, without parsing paths. `path` must be normalized or resolved."""
+        root_str, root_prefix = self._root_strings(resolved)
+        path_str = str(path)
+        return path_str.startswith(root_prefix) or path_str == root_str
 
     def tempdir(self, *, caps=Caps()) -> Path:
         ctx = caps.get(ContextCap)
@@ -36,46 +111,77 @@ class StorageProviderAsset(Asset):
         return f() if not ctx else ctx.cached(CacheKey.TEMPDIR, f)
 
     def _create_tempdir(self) -> Path:
-        dir = self._exitstack.enter_context(TemporaryDirectory())
-        return Path(dir)
+        temp_root = self._temp_root
+        if temp_root is None:
+            with self._temp_root_lock:
+                temp_root = self._temp_root
+                if temp_root is None:
+                    temp_root = self._temp_root = Path(self._exitstack.enter_context(TemporaryDirectory()))
+        return Path(mkdtemp(dir=temp_root))
 
     def persistent_dir(self, *, caps=Caps()) -> Path:
         # Read capabilities
         ctx = caps.get(ContextCap)
-        name = ctx.recipe_name if ctx else None
-        sc = caps.get(StorageCap, StorageCap())
-        tag = sc.tag or (name.lower() if name else None)
-        if tag is None:
+        sc = caps.get(StorageCap, _DEFAULT_STORAGE_CAP)
+
+        # For a given recipe, the directory only depends on the storage cap.
+        # So probe the recipe's cache before deriving anything, a hit needs no closure either.
+        key = (CacheKey.PERSISTENT_DIR, sc)
+        if ctx and (path := ctx.cache.get(key)) is not None:
+            return path
+
+        tag = sc.tag or (ctx.name_lower if ctx else None)
+        if not tag:
             raise ValueError("Missing storage name")
-        shared = sc.shared
 
-        f = lambda: self._create_persistent_dir(tag=tag, shared=shared)
-        return f() if not ctx else ctx.cached((CacheKey.PERSISTENT_DIR, tag, shared), f)
+        path = self._create_persistent_dir(
+            tag=tag, shared=sc.shared, follow_symlinks=sc.follow_symlinks, shard_bits=sc.shard_bits
+        )
+        if ctx:
+            ctx.cache[key] = path
+        return path
 
-    def _create_persistent_dir(self, tag: str, shared: bool) -> Path:
-        # Resolve path
-        if shared:
-            path = (self._root / 'shared' / tag).resolve()
-        else:
-            if self._project is None:
-                raise ValueError(f"Recipe workdir is project-specific, but Plan has no project set")
-            path = (self._root / 'projects' / self._project / tag).resolve()
+    def _create_persistent_dir(self, tag: str, shared: bool, follow_symlinks: bool = False, shard_bits: int = 0) -> Path:
+        # Each directory only needs to be resolved and created once
+        key = (tag, shared, follow_symlinks, shard_bits)
+        try:
+            return self._persistent_dirs[key]
+        except KeyError:
+            pass
+
+        if not shared and self._project is None:
+            raise ValueError(f"Recipe workdir is project-specific, but Plan has no project set")
+
+        # Resolve path. Within a trusted root, normalizing without any syscalls is enough.
+        resolve = follow_symlinks or not self._trusted
+        project = None if shared else self._project
+        path_str = _persistent_dir_path(self._root_strings()[0], project, tag, shared, shard_bits)
+        path = Path(path_str).resolve() if resolve else Path(os.path.normpath(path_str))
 
         # Validity check
-        if not path.is_relative_to(self._root):
+        if not self._is_within_root(path, resolved=resolve):
             raise ValueError(f"Recipe workdir path '{path}' escapes root")
 
-        # Allow creation of missing relative path components
-        path.mkdir(exist_ok=True, parents=True)
+        # Allow creation of missing relative path components, unless the parent is known to exist
+        if path not in self._created_dirs:
+            _mkdir(path, parents=path.parent not in self._created_dirs)
+            self._created_dirs.add(path)
+            self._created_dirs.update(path.parents)
 
+        self._persistent_dirs[key] = path
         return path
 
 
-@dataclass
+@dataclass(slots=True, weakref_slot=True)
 class StorageConfAsset(Asset):
     """Configuration for `StorageProviderAsset`."""
     root: Path | str
     project: str | None = None
+    trusted: bool = False
+    """
+    Whether the root is trusted not to contain symlinks, see `StorageCap.follow_symlinks`.
+    Opt-in: a trusted root skips resolving paths, so a symlink pointing outside of it is no longer rejected.
+    """
 
 
 class StorageProviderRecipe(Recipe):
@@ -85,12 +191,25 @@ class StorageProviderRecipe(Recipe):
 
     @contextmanager
     def make(self):
+        # An absolute root within trusted storage only needs to be normalized, which needs no syscalls
+        root = Path(self.conf.root)
+        if self.conf.trusted and root.is_absolute():
+            root = Path(os.path.normpath(root))
+        else:
+            root = root.resolve()
+
         exitstack = ExitStack()
+        provider = StorageProviderAsset(
+            _root=root,
+            _project=self.conf.project or None,
+            _exitstack=exitstack,
+            _trusted=self.conf.trusted
+        )
         try:
-            yield StorageProviderAsset(
-                _root=Path(self.conf.root).resolve(),
-                _project=self.conf.project or None,
-                _exitstack=exitstack
-            )
+            yield provider
         finally:
             exitstack.close()
+            # The directories may be removed once the provider is released, so do not hand them out anymore
+            provider._persistent_dirs.clear()
+            provider._created_dirs.clear()
+            provider._temp_root = None
@@ -27,4 +27,5 @@ def inject(key: str | None = None):
 
 
 def is_asset_class(obj) -> TypeGuard[type[Asset]]:
+    # Not cached: ABCMeta already caches subclass checks, in weak sets that do not keep classes alive
     return inspect.isclass(obj) and issubclass(obj, Asset)
@@ -0,0 +1,127 @@
+import threading
+import time
+from contextlib import contextmanager
+
+import pytest
+
+from planner import Recipe, DataAsset, Planner, inject
+
+
+class A(DataAsset[str]): pass
+class B(DataAsset[str]): pass
+class C(DataAsset[str]): pass
+class D(DataAsset[str]): pass
+
+
+def tracked_recipe(makes: type[DataAsset[str]], events: list[str], name: str, cost: float = 1) -> type[Recipe]:
+    """Recipe without dependencies that records when its asset is entered and exited."""
+    class _Recipe(Recipe):
+        _makes = makes
+        _estimated_cost = cost
+
+        @contextmanager
+        def make(self):
+            events.append(f"enter {name}")
+            try:
+                yield makes(name)
+            finally:
+                events.append(f"exit {name}")
+    return _Recipe
+
+
+class DRecipe(Recipe):
+    _makes = D
+    a: A = inject()
+    b: B = inject()
+    c: C = inject()
+
+    def make(self):
+        return D(self.a.d + self.b.d + self.c.d)
+
+
+@pytest.mark.parametrize("defer_cleanup", [False, True])
+def test_parallel_matches_sequential(defer_cleanup: bool):
+    events: list[str] = []
+    plan = (
+        Planner()
+        .add(tracked_recipe(A, events, "a"))
+        .add(tracked_recipe(B, events, "b"))
+        .add(tracked_recipe(C, events, "c"))
+        .add(DRecipe)
+        .plan(D)
+    )
+
+    results = {}
+    for max_workers in (1, 2, 4):
+        events.clear()
+        with plan.run(defer_cleanup=defer_cleanup, max_workers=max_workers) as res:
+            results[max_workers] = res.d
+        results[max_workers, "events"] = sorted(events)
+
+    assert results[1] == results[2] == results[4] == "abc"
+    assert results[1, "events"] == results[2, "events"] == results[4, "events"]
+
+
+def test_independent_branches_overlap():
+    # Each recipe only gets past the barrier if the other one runs at the same time
+    barrier = threading.Barrier(2, timeout=5)
+
+    def waiting_recipe(makes: type[DataAsset[str]], name: str) -> type[Recipe]:
+        class _Recipe(Recipe):
+            _makes = makes
+
+            def make(self):
+                barrier.wait()
+                return makes(name)
+        return _Recipe
+
+    class ConcatRecipe(Recipe):
+        _makes = C
+        a: A = inject()
+        b: B = inject()
+
+        def make(self):
+            return C(self.a.d + self.b.d)
+
+    plan = Planner().add(waiting_recipe(A, "a")).add(waiting_recipe(B, "b")).add(ConcatRecipe).plan(C)
+    with plan.run(max_workers=2) as res:
+        assert res.d == "ab"
+
+
+def test_failure_cancels_queued_and_cleans_up_built():
+    events: list[str] = []
+    failed = threading.Event()
+
+    class SlowA(Recipe):
+        _makes = A
+        _estimated_cost = 3
+
+        @contextmanager
+        def make(self):
+            # Still running when the failure is seen, so that no worker frees up for the queued recipe
+            failed.wait(timeout=5)
+            time.sleep(0.2)
+            events.append("enter a")
+            try:
+                yield A("a")
+            finally:
+                events.append("exit a")
+
+    class FailingB(Recipe):
+        _makes = B
+        _estimated_cost = 2
+
+        def make(self):
+            failed.set()
+            raise KeyError("boom")
+
+    # Lowest rank, so it is only submitted once a worker is free
+    QueuedC = tracked_recipe(C, events, "c", cost=1)
+
+    plan = Planner().add(SlowA).add(FailingB).add(QueuedC).add(DRecipe).plan(D)
+    with pytest.raises(RuntimeError) as exc_info:
+        with plan.run(max_workers=2):
+            pass
+
+    assert isinstance(exc_info.value.__cause__, KeyError)
+    assert events == ["enter a", "exit a"]